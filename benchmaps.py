@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Benchmark the address map pipeline on synthetic areas of growing size
+#-----------------------------------------------------------------------------
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import datetime as dt
+import subprocess
+from contextlib import redirect_stdout
+from csv import DictWriter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from name import chooseName, chooseAddress
+from blisslib import Document, Profile, NullProfile, makeDoc
+from makecdmap import Map
+from makecdlist import AddressList
+
+Occupancies = ["", "Vacant", "Permanent", "Occasional", "Holidays",
+               "Accommodation", "Business"]
+Fields = ['rapid', 'number', 'address', 'names', 'phone', 'occupancy']
+
+#-----------------------------------------------------------------------------
+def makeRow(rapid):
+    street = chooseAddress()[0]
+    number, address = street.split(" ", 1)
+    names = ", ".join(chooseName() for _ in range(random.randint(1, 3)))
+    phone = "07 {}".format(random.randint(1000000, 9999999))
+    return {'rapid':     str(rapid),
+            'number':    number,
+            'address':   address,
+            'names':     names,
+            'phone':     phone,
+            'occupancy': random.choice(Occupancies)}
+
+def makeRows(size):
+    return [makeRow(1000 + num) for num in range(size)]
+
+def churnRows(rows, changedPct, removedPct):
+    """A copy of rows with some removed and some others changed"""
+    numRemoved = len(rows) * removedPct // 100
+    numChanged = len(rows) * changedPct // 100
+    kept = random.sample(rows, len(rows) - numRemoved)
+    kept.sort(key=lambda row: int(row['rapid']))
+    changed = set(random.sample(range(len(kept)), numChanged))
+    churned = []
+    for num, row in enumerate(kept):
+        row = dict(row)
+        if num in changed:
+            row['names'] = chooseName()
+            row['occupancy'] = random.choice(Occupancies)
+        churned.append(row)
+    return churned
+
+def writeCsv(path, rows):
+    with open(path, "w", newline='') as csvFile:
+        csv = DictWriter(csvFile, Fields)
+        csv.writeheader()
+        csv.writerows(rows)
+
+#-----------------------------------------------------------------------------
+def timeRun(func):
+    Document.profile = profile = Profile()
+    # the documents' own reports, such as stale addresses removed, are
+    # counted in the profile instead
+    try:
+        with open(os.devnull, "w") as devNull, redirect_stdout(devNull):
+            start = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - start
+    finally:
+        Document.profile = NullProfile()
+    result = {'seconds': seconds}
+    result.update(profile.asDict())
+    return result
+
+def benchDoc(docClass, workDir, size, freshCsv, churnCsv):
+    svgPath = workDir / "{}-{}.svg".format(docClass.__name__, size)
+    results = {}
+    results['create'] = timeRun(lambda: makeDoc(freshCsv, docClass(svgPath)))
+    results['refresh'] = timeRun(lambda: makeDoc(churnCsv, docClass(svgPath)))
+    # loaded outside the timing, so that only the writing is timed
+    doc = docClass(svgPath)
+    doc.modified = True
+    results['save'] = timeRun(lambda: doc.save(backup=False))
+    return results
+
+def runBenchmarks(sizes, changedPct, removedPct,
+                  docClasses=(Map, AddressList)):
+    results = []
+    with TemporaryDirectory() as tmpDir:
+        workDir = Path(tmpDir)
+        for size in sizes:
+            rows = makeRows(size)
+            freshCsv = workDir / "fresh-{}.csv".format(size)
+            churnCsv = workDir / "churn-{}.csv".format(size)
+            writeCsv(freshCsv, rows)
+            writeCsv(churnCsv, churnRows(rows, changedPct, removedPct))
+            for docClass in docClasses:
+                timings = benchDoc(docClass, workDir, size, freshCsv, churnCsv)
+                results.append({'document': docClass.__name__,
+                                'size':     size,
+                                'timings':  timings})
+                print("{:<12} {:>7} addresses: create {:7.3f}s, "
+                      "refresh {:7.3f}s, save {:7.3f}s"
+                      .format(docClass.__name__, size,
+                              timings['create']['seconds'],
+                              timings['refresh']['seconds'],
+                              timings['save']['seconds']))
+    return results
+
+def getVersion():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(["git", "describe", "--always",
+                                        "--dirty"], cwd=here,
+                                       stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#-----------------------------------------------------------------------------
+def parseArgs(rawArgs):
+    def parseSizes(sizeSpec):
+        return [int(size) for size in sizeSpec.split(",")]
+
+    parser = argparse.ArgumentParser(description=
+        "Benchmark the maps and address lists on synthetic areas")
+    parser.add_argument("--sizes", type=parseSizes,
+                        default=[100, 1000, 10000],
+                        help="comma separated numbers of addresses")
+    parser.add_argument("--changed", type=int, default=10, metavar="PCT",
+                        help="percentage of rows changed for the refresh")
+    parser.add_argument("--removed", type=int, default=5, metavar="PCT",
+                        help="percentage of rows removed for the refresh")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("outpath", metavar="Results.json",
+                        nargs="?", default="benchmaps.json")
+    args = parser.parse_args(rawArgs)
+    return args
+
+#-----------------------------------------------------------------------------
+def main(rawArgs=sys.argv[1:]):
+    args = parseArgs(rawArgs)
+    random.seed(args.seed)
+    results = runBenchmarks(args.sizes, args.changed, args.removed)
+    report = {'version':  getVersion(),
+              'date':     dt.datetime.now().isoformat(timespec='seconds'),
+              'python':   platform.python_version(),
+              'changed%': args.changed,
+              'removed%': args.removed,
+              'seed':     args.seed,
+              'results':  results}
+    with open(args.outpath, "w") as fileOut:
+        json.dump(report, fileOut, indent=1)
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Micro-benchmark of the per-address cost of blisslib's SVG lookups, before
+# and after the namespace expansion was memoized and each group's labelled
+# children indexed once by Address.
+#-----------------------------------------------------------------------------
+import sys
+import argparse
+import timeit
+import xml.etree.ElementTree as ET
+from blisslib import SVG, Address
+from makecdmap import Map
+
+#-----------------------------------------------------------------------------
+def _expandUncached(tag):
+    # blisslib's SVG._expand as it was
+    if tag[0] != '{' and ':' in tag:
+        prefix, tag = tag.split(":", 1)
+        tag = "{%s}%s" % (SVG.NS[prefix], tag)
+    return tag
+
+def perAddressBefore(group):
+    ET.Element.get(group, _expandUncached("inkscape:label"))
+    for label in ("textRAPID", "textDetails"):
+        text = ET.Element.find(group,
+                    "svg:text[@inkscape:label='{}']".format(label), SVG.NS)
+        ET.Element.find(text, "svg:tspan", SVG.NS)
+    use = ET.Element.find(group,
+                    "svg:use[@inkscape:label='symbolOccupancy']", SVG.NS)
+    ET.Element.set(use, _expandUncached("xlink:href"), "#house_symbol")
+
+def perAddressAfter(group, doc):
+    # what Document.load and _updateOccupancy do now
+    group.get("inkscape:label")
+    address = Address(group, {'occupancy': "Permanent"})
+    for label in ("textRAPID", "textDetails"):
+        doc._textOrTspan(address.part(label))
+    doc._updateOccupancy(address)
+
+#-----------------------------------------------------------------------------
+def bench(func, number, *funcArgs):
+    seconds = min(timeit.repeat(lambda: func(*funcArgs),
+                                number=number, repeat=5))
+    return seconds / number * 1e6
+
+def parseArgs(rawArgs):
+    parser = argparse.ArgumentParser(description=
+        "Time the per-address cost of the SVG lookups")
+    parser.add_argument("-n", "--number", type=int, default=20000,
+                        help="addresses per timing run")
+    args = parser.parse_args(rawArgs)
+    return args
+
+#-----------------------------------------------------------------------------
+def main(rawArgs=sys.argv[1:]):
+    args = parseArgs(rawArgs)
+    group = Map._getAddressPrototype().clone()
+    # never loaded or saved, only lent to _updateOccupancy
+    doc = Map("benchsvg.svg")
+    before = bench(perAddressBefore, args.number, group)
+    after  = bench(perAddressAfter, args.number, group, doc)
+    print("before: {:6.2f} us/address".format(before))
+    print("after:  {:6.2f} us/address".format(after))
+    print("speedup: {:.1f}x".format(before / after))
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
@@ -2,11 +2,20 @@
 #-----------------------------------------------------------------------------
 import sys
 import os
+import re
+import math
+import shutil
+import hashlib
+import json
+import time
+import cProfile
 import datetime as dt
+from contextlib import contextmanager, nullcontext
 from itertools import chain
-from csv import DictReader
+import csv
 from pathlib import Path
 import xml.etree.ElementTree as ET
+from xml.etree import ElementPath
 
 
 #-----------------------------------------------------------------------------
@@ -19,12 +28,31 @@ class SVG:
           "inkscape": "http://www.inkscape.org/namespaces/inkscape"}
     for prefix, uri in NS.items():
         ET.register_namespace(prefix, uri)
+    LabelKey = "{%s}label" % NS["inkscape"]
+
+    _expanded = {}
+    _expandedPaths = {}
+    _labelQueries = {}
 
     def _expand(tag):
-        if tag[0] != '{' and ':' in tag:
-            prefix, tag = tag.split(":", 1)
-            tag = "{%s}%s" % (SVG.NS[prefix], tag)
-        return tag
+        expanded = SVG._expanded.get(tag)
+        if expanded is None:
+            expanded = tag
+            if tag[0] != '{' and ':' in tag:
+                prefix, local = tag.split(":", 1)
+                expanded = "{%s}%s" % (SVG.NS[prefix], local)
+            SVG._expanded[tag] = expanded
+        return expanded
+
+    def _expandPath(path):
+        # so ElementPath can look up its compiled selector without us
+        # passing (and it sorting) the namespaces on every call
+        expanded = SVG._expandedPaths.get(path)
+        if expanded is None:
+            tokens = ElementPath.xpath_tokenizer(path, SVG.NS)
+            expanded = "".join(op or tag for op, tag in tokens)
+            SVG._expandedPaths[path] = expanded
+        return expanded
 
     def _getParser():
         builder = ET.TreeBuilder(element_factory=SVG.Element)
@@ -41,14 +69,23 @@ class SVG:
             root = ET.XML(docXml, parser=SVG._getParser())
             return root[0]
 
+        def clone(self):
+            """A deep copy that keeps the SVG.Element class"""
+            twin = SVG.Element(self.tag, self.attrib)
+            twin.text = self.text
+            twin.tail = self.tail
+            # children made by ET.SubElement are plain ET.Elements
+            twin.extend([SVG.Element.clone(child) for child in self])
+            return twin
+
         def find(self, path, ns=None):
             if ns is None:
-                ns = SVG.NS
+                return super().find(SVG._expandPath(path))
             return super().find(path, ns)
 
         def findall(self, path, ns=None):
             if ns is None:
-                ns = SVG.NS
+                return super().findall(SVG._expandPath(path))
             return super().findall(path, ns)
 
         def get(self, key, default=None):
@@ -57,6 +94,57 @@ class SVG:
         def set(self, key, value):
             return super().set(SVG._expand(key), value)
 
+    class LabelQuery:
+        """A precompiled selector for the children of an element with the
+        given tag, inkscape:label and other attributes"""
+        def __init__(self, tag, label, attribs):
+            self.tag     = SVG._expand(tag)
+            self.label   = label
+            self.attribs = [(SVG._expand(k), v) for k, v in attribs]
+
+        def find(self, element):
+            for child in element:
+                if (child.tag == self.tag and
+                    child.attrib.get(SVG.LabelKey) == self.label and
+                    all(child.attrib.get(k) == v for k, v in self.attribs)):
+                    return child
+            return None
+
+    def labelQuery(tag, label, **attribs):
+        """Get the registered query for tag[@inkscape:label='label'],
+        e.g. SVG.labelQuery("svg:g", "Base", groupmode="layer")"""
+        attribs = tuple(sorted(("inkscape:"+k, v) for k, v in attribs.items()))
+        key = (tag, label, attribs)
+        query = SVG._labelQueries.get(key)
+        if query is None:
+            query = SVG._labelQueries[key] = SVG.LabelQuery(tag, label,
+                                                            attribs)
+        return query
+
+    def labelIndex(element):
+        """Map the inkscape:label of each child to the child"""
+        labelKey = SVG.LabelKey
+        index = {}
+        for child in element:
+            label = child.attrib.get(labelKey)
+            if label is not None:
+                index.setdefault(label, child)
+        return index
+
+    _TransformRE = re.compile(r"(translate|matrix)\s*\(([^)]*)\)")
+
+    def getOffset(element):
+        """The (x, y) an element's transform moves it by"""
+        match = SVG._TransformRE.search(element.get("transform", ""))
+        if match is None:
+            return 0.0, 0.0
+        values = [float(value) for value in
+                  re.split(r"[\s,]+", match.group(2).strip()) if value]
+        if match.group(1) == "matrix":
+            values = values[4:6]
+        values += [0.0] * (2 - len(values))
+        return values[0], values[1]
+
     def SubElement(parent, tag, attrib={}, **extra):
         tag = SVG._expand(tag)
         attrib = {SVG._expand(k): v for k,v in attrib.items()}
@@ -75,96 +163,274 @@ class SVG:
             return cls(root)
 
 
+#-----------------------------------------------------------------------------
+class SpatialGrid:
+    """A uniform grid index of rectangles (x0, y0, x1, y1), for finding
+    whether a new rectangle would overlap any already there"""
+    def __init__(self, cellWidth, cellHeight):
+        self.cellWidth  = cellWidth
+        self.cellHeight = cellHeight
+        self.cells      = {}
+
+    def _cellKeys(self, rect):
+        x0, y0, x1, y1 = rect
+        for col in range(math.floor(x0 / self.cellWidth),
+                         math.floor(x1 / self.cellWidth) + 1):
+            for row in range(math.floor(y0 / self.cellHeight),
+                             math.floor(y1 / self.cellHeight) + 1):
+                yield col, row
+
+    def insert(self, rect):
+        for key in self._cellKeys(rect):
+            self.cells.setdefault(key, []).append(rect)
+
+    def overlaps(self, rect):
+        x0, y0, x1, y1 = rect
+        for key in self._cellKeys(rect):
+            for other in self.cells.get(key, ()):
+                if (other[0] < x1 and x0 < other[2] and
+                    other[1] < y1 and y0 < other[3]):
+                    return True
+        return False
+
+#-----------------------------------------------------------------------------
+class Profile:
+    """Wall time and counters for the phases of refreshing documents"""
+    def __init__(self):
+        self.times  = {}
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def count(self, name, num=1):
+        self.counts[name] = self.counts.get(name, 0) + num
+
+    def asDict(self):
+        return {'times': dict(self.times), 'counts': dict(self.counts)}
+
+    def summary(self):
+        lines = ["{:<16}{:>10.3f}s".format(name, seconds)
+                 for name, seconds in self.times.items()]
+        lines += ["{:<16}{:>10}".format(name, num)
+                  for name, num in self.counts.items()]
+        return "\n".join(lines)
+
+    def report(self, path="-"):
+        if path == "-":
+            print(self.summary())
+        else:
+            with open(path, "w") as fileOut:
+                json.dump(self.asDict(), fileOut, indent=1)
+
+class NullProfile(Profile):
+    """A Profile which records nothing"""
+    def phase(self, name):
+        return nullcontext()
+
+    def count(self, name, num=1):
+        pass
+
 #-----------------------------------------------------------------------------
 class Address:
+    """An address group, with the fields of its row that get rendered.
+    Addresses with no row (data is None) are stale."""
+    Fields = ('rapid', 'number', 'names', 'phone', 'occupancy')
+    __slots__ = ('element', 'parts', '_details') + Fields
+
     def __init__(self, element, data=None):
         self.element = element
+        self.parts   = SVG.labelIndex(element)
         self.data    = data
 
-    def __prop(item):
-        def get(obj):
-            if obj.data is not None:
-                return obj.data.get(item)
-        return property(get)
-    names       = __prop('names')
-    phone       = __prop('phone')
-    number      = __prop('number')
-    address     = __prop('address')
-    rapid       = __prop('rapid')
-    occupancy   = __prop('occupancy')
+    def part(self, label):
+        return self.parts.get(label)
+
+    @property
+    def data(self):
+        if self.rapid is None:
+            return None
+        return {field: getattr(self, field) for field in self.Fields}
+
+    @data.setter
+    def data(self, row):
+        if row is None:
+            row = {}
+        for field in self.Fields:
+            setattr(self, field, row.get(field))
+        self._details = None
 
     @property
     def details(self):
-        if self.data is None:
+        if self.rapid is None:
             return ""
-        return [dtl.strip() for dtl in chain(self.names.split(","), "\n",
-                                             self.phone.split(","))]
+        if self._details is None:
+            self._details = [dtl.strip() for dtl in
+                             chain((self.names or "").split(","), "\n",
+                                   (self.phone or "").split(","))]
+        return self._details
 
 #-----------------------------------------------------------------------------
 class Document:
+    addressXml = None     # template for a new address group, see _cloneAddress
+    pageCapacity = None   # how many addresses fit on a page, see PagedDocument
+    profile = NullProfile()   # set to a Profile to time documents' phases
+    fingerprintFields = ('names', 'phone', 'occupancy')
+
     def __init__(self, path, landscape=False):
         self.path = Path(path)
         self.addresses = {}
-        self.nextX = self.nextY = 5
-        if self.path.is_file():
-            self.load()
-        else:
-            self.new(landscape)
+        self.modified = False
+        with self.profile.phase("load"):
+            if self.path.is_file():
+                self.load()
+            else:
+                self.new(landscape)
         self._updateDate()
 
     def load(self):
         self.tree = SVG.Tree.fromfile(self.path)
         self.layer = self._getAddressLayer()
         self.addresses.clear()
-        self.nextX = self.nextY = 5
-        for group in self.layer.findall("svg:g"):
-            label = group.get("inkscape:label")
-            rapid = group.find("svg:text[@inkscape:label='textRAPID']")
+        self.modified = False
+        # one pass over the layer, indexing each group's labelled children
+        # as we go, rather than an ElementPath query per group
+        groupTag = SVG._expand("svg:g")
+        textTag  = SVG._expand("svg:text")
+        for group in self.layer:
+            if group.tag != groupTag:
+                continue
+            address = Address(group)
+            rapid = address.part("textRAPID")
+            if rapid is not None and rapid.tag != textTag:
+                rapid = None
             rapid = self._textOrTspan(rapid)
-            if rapid is None or rapid.text.strip() == "":
+            if rapid is None or (rapid.text or "").strip() == "":
+                label = group.get("inkscape:label")
                 print("Group {} has no RAPID text, skipping.".format(label))
                 continue
             if rapid.text in self.addresses:
                 raise ValueError("Duplicated RAPID {}".format(rapid.text))
-            self.addresses[rapid.text.strip()] = Address(group)
+            self.addresses[rapid.text.strip()] = address
 
     def new(self, landscape):
         self.addresses.clear()
-        self.nextX = self.nextY = 5
+        self.modified = True
         self.tree = SVG.Tree.fromstring(self._createBlankDocXml(landscape))
         self.layer = self._getAddressLayer()
 
+    def copyBase(self, other):
+        """Take everything but the addresses from another document"""
+        root = other.tree.getroot().clone()
+        root.set("sodipodi:docname", self.path.name)
+        self.tree = SVG.Tree(root)
+        self.layer = self._getAddressLayer()
+        self.layer[:] = [child for child in self.layer
+                         if child.tag != SVG._expand("svg:g")]
+        self.addresses.clear()
+        self.modified = True
+
     def save(self, backup=True):
-        if backup and self.path.exists():
-            stem = self.path.stem
-            backupPath = self.path.with_name("{}.bak".format(stem))
-            uniq = 1
-            while backupPath.exists():
-                backupPath = self.path.with_name("{}-{}.bak".format(stem, uniq))
-                uniq += 1
-            os.rename(self.path, backupPath)
-        with self.path.open("w") as fileOut:
-            self.write(fileOut)
+        """Write the document out if it has been modified.
+        Returns whether it was written."""
+        if not self.modified:
+            return False
+        # write to a temporary file and rename it into place, so a failed
+        # write never leaves us without the document
+        tmpPath = self.path.with_name("{}.tmp".format(self.path.name))
+        try:
+            with self.profile.phase("save"):
+                with tmpPath.open("wb") as fileOut:
+                    self.write(fileOut)
+                    fileOut.flush()
+                    os.fsync(fileOut.fileno())
+                    self.profile.count("bytes written", fileOut.tell())
+                if self.path.exists():
+                    shutil.copymode(self.path, tmpPath)
+                    if backup:
+                        self._backup()
+                os.replace(tmpPath, self.path)
+        except:
+            if tmpPath.exists():
+                tmpPath.unlink()
+            raise
+        self.modified = False
+        return True
+
+    def _backup(self):
+        stem = self.path.stem
+        backupPath = self.path.with_name("{}.bak".format(stem))
+        uniq = 1
+        while backupPath.exists():
+            backupPath = self.path.with_name("{}-{}.bak".format(stem, uniq))
+            uniq += 1
+        try:
+            os.link(self.path, backupPath)
+        except OSError:
+            shutil.copy2(self.path, backupPath)
 
     def write(self, fileOut):
-        fileOut.write('<?xml version="1.0" encoding="utf-8" ?>\n')
-        self.tree.write(fileOut, encoding='unicode')
-        fileOut.write('\n')
+        """Stream the document out to a binary file"""
+        fileOut.write(b'<?xml version="1.0" encoding="utf-8" ?>\n')
+        self.tree.write(fileOut, encoding='utf-8', xml_declaration=False)
+        fileOut.write(b'\n')
 
     def addAddress(self, row):
         rapid = row['rapid']
         address = self.addresses.get(rapid)
         if address:
-            self._updateAddress(address, row)
+            fingerprint = self._fingerprint(row)
+            if address.element.get('data-fingerprint') == fingerprint:
+                address.data = row     # nothing we render has changed
+                self.profile.count("unchanged")
+                return
+            with self.profile.phase("update"):
+                self._updateAddress(address, row)
+                self._setAttr(address.element, 'data-fingerprint', fingerprint)
+            self.profile.count("updated")
         else:
-            self.addresses[rapid] = self._createAddress(row)
+            with self.profile.phase("create"):
+                self.addresses[rapid] = self._createAddress(row)
+            self.profile.count("created")
 
     def _updateAddress(self, address, row):
         raise NotImplementedError()
 
+    @classmethod
+    def _getAddressPrototype(cls):
+        # parsed once per Document subclass, then cloned for every new row
+        prototype = cls.__dict__.get('_addressPrototype')
+        if prototype is None:
+            prototype = SVG.Element.fromstring(cls.addressXml)
+            cls._addressPrototype = prototype
+        return prototype
+
+    def _cloneAddress(self, row, x, y):
+        element = self._getAddressPrototype().clone()
+        element.set('transform', "translate({}, {})".format(x, y))
+        element.set('inkscape:label', row['rapid'])
+        element.set('data-fingerprint', self._fingerprint(row))
+        address = Address(element, row)
+        address.part("textRAPID").text = row['rapid']
+        address.part("textNumber").text = row['number']
+        self.layer.append(element)
+        self.modified = True
+        return address
+
     def _createAddress(self, row):
         raise NotImplementedError()
 
+    def _fingerprint(self, row):
+        fields = "\x1f".join(row.get(field) or ""
+                              for field in self.fingerprintFields)
+        return hashlib.blake2b(fields.encode(), digest_size=8).hexdigest()
+
     def _updateDetails(self, address):
         raise NotImplementedError()
 
@@ -178,36 +444,74 @@ class Document:
                    "Business":      "warehouse_symbol"}
         occupancySymbol = symbols.get(address.occupancy,
                                       symbols['unknown'])
-        use = address.element.find("svg:use[@inkscape:label='symbolOccupancy']")
-        use.set('xlink:href', "#"+occupancySymbol)
+        use = address.part("symbolOccupancy")
+        self._setAttr(use, 'xlink:href', "#"+occupancySymbol)
 
-    def clearStaleAddresses(self):
+    def clearStaleAddresses(self, removable=None):
+        """Remove the addresses that were not refreshed, only those with
+        RAPIDs in removable if that is given.
+        Returns the number of groups removed."""
         freshAddresses = {}
+        staleElements = set()
         for rapid, address in self.addresses.items():
-            if address.data is None:
-                self.layer.remove(address.element)
+            if (address.rapid is None and
+                (removable is None or rapid in removable)):
+                staleElements.add(id(address.element))
             else:
                 freshAddresses[rapid] = address
         self.addresses = freshAddresses
+        self.profile.count("removed", len(staleElements))
+        if staleElements:
+            # rebuild the layer in one pass, layer.remove() is linear per call
+            self.layer[:] = [child for child in self.layer
+                             if id(child) not in staleElements]
+            self.modified = True
+        return len(staleElements)
+
+    def takeAddresses(self, rapids):
+        """Take the addresses with these RAPIDs out of the document, for
+        another document to adopt.  Returns them by RAPID."""
+        taken = {rapid: self.addresses.pop(rapid) for rapid in rapids}
+        if taken:
+            takenElements = {id(address.element) for address in taken.values()}
+            self.layer[:] = [child for child in self.layer
+                             if id(child) not in takenElements]
+            self.modified = True
+        return taken
+
+    def adoptAddress(self, rapid, address):
+        """Put an address taken out of another page of the document where
+        it was on that page, keeping any placing by hand"""
+        self.layer.append(address.element)
+        self.addresses[rapid] = address
+        self.modified = True
 
     def _getAddressLayer(self):
-        layer = self.tree.find("svg:g"
-                               "[@inkscape:groupmode='layer']"
-                               "[@inkscape:label='Addresses']")
+        layer = SVG.labelQuery("svg:g", "Addresses",
+                               groupmode="layer").find(self.tree.getroot())
         if layer is None:
             raise RuntimeError("No Addresses layer in map")
         return layer
 
     def _updateDate(self):
-        layer = self.tree.find("svg:g"
-                               "[@inkscape:groupmode='layer']"
-                               "[@inkscape:label='Base']")
+        layer = SVG.labelQuery("svg:g", "Base",
+                               groupmode="layer").find(self.tree.getroot())
         text = layer.find(".//svg:text"
                           "[@inkscape:label='textLastUpdated']")
         if text:
             element = self._textOrTspan(text)
             today = dt.date.today()
-            element.text = "Last updated: {:%e %B %Y}".format(today)
+            self._setText(element, "Last updated: {:%e %B %Y}".format(today))
+
+    def _setText(self, element, text):
+        if (element.text or "") != (text or ""):
+            element.text = text
+            self.modified = True
+
+    def _setAttr(self, element, key, value):
+        if element.get(key) != value:
+            element.set(key, value)
+            self.modified = True
 
     def _textOrTspan(self, text):
         if text:
@@ -486,22 +790,275 @@ class Document:
         return xml
 
 #-----------------------------------------------------------------------------
-def makeDoc(csvPath, doc, clearStale=True):
-    with open(csvPath, "r", newline='') as csvFile:
-        csv = DictReader(csvFile)
-        for row in csv:
-            rapid = row.get('rapid')
-            if not rapid or rapid.strip() == "":
-                rowId = str(csv.line_num)
-                names = row.get('names')
-                if names is not None:
-                    rowId += " ({})".format(names)
-                print("Row {} has no RAPID, skipping.".format(rowId))
-                continue
+class PagedDocument:
+    """A document split over page files, each a Document of docClass with
+    its own copy of the Base layer and defs, holding up to capacity
+    addresses.  The first page keeps the document's own path.
+    Addresses stay on the page they are on, unless repaginate is set, when
+    those beyond capacity are moved to pages with room."""
+    def __init__(self, docClass, path, capacity=None, repaginate=False,
+                 **docKwargs):
+        self.docClass  = docClass
+        self.path      = Path(path)
+        self.capacity  = capacity or docClass.pageCapacity
+        self.docKwargs = docKwargs
+        if not self.capacity:
+            raise ValueError("No page capacity for {}".format(docClass.__name__))
+        self.pages     = [docClass(pagePath, **docKwargs)
+                          for pagePath in self.getPagePaths(self.path)]
+        self.pageOf    = {}
+        self.pending   = {}
+        if repaginate:
+            self._repaginate()
+        for page in self.pages:
+            for rapid in page.addresses:
+                self.pageOf[rapid] = page
+
+    @staticmethod
+    def pagePath(path, num):
+        path = Path(path)
+        if num == 1:
+            return path
+        return path.with_name("{}-p{}{}".format(path.stem, num, path.suffix))
+
+    @classmethod
+    def getPagePaths(cls, path):
+        """The paths of the existing pages, at least the first page's"""
+        paths = [cls.pagePath(path, 1)]
+        while True:
+            pagePath = cls.pagePath(path, len(paths) + 1)
+            if not pagePath.is_file():
+                break
+            paths.append(pagePath)
+        return paths
+
+    @property
+    def modified(self):
+        return any(page.modified for page in self.pages)
+
+    def addAddress(self, row):
+        rapid = row['rapid']
+        page = self.pageOf.get(rapid)
+        if page is not None:
+            page.addAddress(row)
+        else:
+            # placed once we know how much room stale addresses leave
+            self.pending[rapid] = row
+
+    def clearStaleAddresses(self, removable=None):
+        numRemoved = sum(page.clearStaleAddresses(removable)
+                         for page in self.pages)
+        for rapid, page in list(self.pageOf.items()):
+            if rapid not in page.addresses:
+                del self.pageOf[rapid]
+        self._placePending()
+        return numRemoved
+
+    def save(self, backup=True):
+        """Write out the pages which have been modified.
+        Returns whether any were written."""
+        self._placePending()
+        saved = [page.save(backup) for page in self.pages]
+        return any(saved)
+
+    def _repaginate(self):
+        """Move the addresses beyond capacity on each page onto pages with
+        room, such as those of a document made before it was paged or with
+        a bigger capacity.  This is done before any slots are indexed, so
+        that new addresses are kept clear of the moved ones."""
+        overflow = {}
+        for page in self.pages:
+            if len(page.addresses) > self.capacity:
+                extra = list(page.addresses)[self.capacity:]
+                overflow.update(page.takeAddresses(extra))
+        pageNum = 0
+        for rapid, address in overflow.items():
+            pageNum = self._pageWithRoom(pageNum)
+            self.pages[pageNum].adoptAddress(rapid, address)
+
+    def _placePending(self):
+        pageNum = 0
+        for rapid, row in self.pending.items():
+            pageNum = self._pageWithRoom(pageNum)
+            page = self.pages[pageNum]
+            page.addAddress(row)
+            self.pageOf[rapid] = page
+        self.pending.clear()
+
+    def _pageWithRoom(self, pageNum):
+        """The number of the first page from pageNum on with room for
+        another address, adding a page if none has"""
+        while (pageNum < len(self.pages) and
+               len(self.pages[pageNum].addresses) >= self.capacity):
+            pageNum += 1
+        if pageNum == len(self.pages):
+            self._addPage()
+        return pageNum
+
+    def _addPage(self):
+        pagePath = self.pagePath(self.path, len(self.pages) + 1)
+        page = self.docClass(pagePath, **self.docKwargs)
+        page.copyBase(self.pages[0])
+        self.pages.append(page)
+        return page
+
+#-----------------------------------------------------------------------------
+class Row:
+    """A CSV row, whose fields are looked up through its header's columns"""
+    __slots__ = ('columns', 'values', 'lineNum')
+
+    def __init__(self, columns, values, lineNum):
+        self.columns = columns
+        self.values  = values
+        self.lineNum = lineNum
+
+    def get(self, field, default=None):
+        col = self.columns.get(field)
+        if col is None or col >= len(self.values):
+            return default
+        return self.values[col]
+
+    def __getitem__(self, field):
+        col = self.columns[field]
+        if col >= len(self.values):
+            return None
+        return self.values[col]
+
+class AddressReader:
+    """Reads the rows of an addresses CSV file which have a unique RAPID,
+    keeping the others as rejects"""
+    def __init__(self, csvPath, profile=None):
+        self.csvPath = Path(csvPath)
+        self.profile = profile if profile is not None else Document.profile
+        self.header  = []
+        self.rejects = []
+
+    def __iter__(self):
+        profile = self.profile
+        firstSeen = {}
+        with self.csvPath.open("r", newline='') as csvFile:
+            reader = csv.reader(csvFile)
+            self.header = next(reader, [])
+            columns = {}
+            for col, field in enumerate(self.header):
+                columns.setdefault(field, col)
+            rapidCol = columns.get('rapid')
+            for values in reader:
+                if not values:
+                    continue
+                profile.count("rows read")
+                row = Row(columns, values, reader.line_num)
+                rapid = None
+                if rapidCol is not None and rapidCol < len(values):
+                    rapid = values[rapidCol]
+                if not rapid or rapid.strip() == "":
+                    self._reject(row, "no RAPID")
+                elif rapid in firstSeen:
+                    self._reject(row, "duplicate RAPID, first on line {}"
+                                      .format(firstSeen[rapid]))
+                else:
+                    firstSeen[rapid] = row.lineNum
+                    yield row
+
+    def _reject(self, row, reason):
+        self.profile.count("rows skipped")
+        self.rejects.append((row.lineNum, reason, row.values))
+
+    def rejectsPath(self):
+        stem = self.csvPath.stem
+        return self.csvPath.with_name("{}.rejects.csv".format(stem))
+
+    def writeRejects(self, path=None):
+        """Write the rejected rows out, or remove an old rejects file if
+        there were none.  Returns the path, if written."""
+        path = Path(path) if path is not None else self.rejectsPath()
+        if not self.rejects:
+            if path.is_file():
+                path.unlink()
+            return None
+        with path.open("w", newline='') as fileOut:
+            writer = csv.writer(fileOut)
+            writer.writerow(["line", "reason"] + self.header)
+            for lineNum, reason, values in self.rejects:
+                writer.writerow([lineNum, reason] + values)
+        return path
+
+#-----------------------------------------------------------------------------
+def hashFile(path):
+    """The SHA-1 of a file's contents, read a chunk at a time"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as fileIn:
+        for chunk in iter(lambda: fileIn.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def makeDocs(csvPath, docs, clearStale=True, rejectsPath=None):
+    """Refresh several documents from one read of the CSV file.
+    Returns whether each document was saved."""
+    profile = Document.profile
+    reader = AddressReader(csvPath, profile)
+    rows = iter(reader)
+    while True:
+        with profile.phase("read"):
+            row = next(rows, None)
+        if row is None:
+            break
+        for doc in docs:
             doc.addAddress(row)
+    rejectsPath = reader.writeRejects(rejectsPath)
+    if rejectsPath is not None:
+        print("Rejected {} rows, see {}.".format(len(reader.rejects),
+                                                 rejectsPath))
+    return saveDocs(docs, clearStale)
+
+def saveDocs(docs, clearStale=True, removable=None):
+    """Clear the stale addresses, or just those with RAPIDs in removable,
+    from the refreshed documents and save them.
+    Returns whether each document was saved."""
+    profile = Document.profile
+    saved = []
+    for doc in docs:
         if clearStale:
-            doc.clearStaleAddresses()
-        doc.save()
+            with profile.phase("clearStale"):
+                numRemoved = doc.clearStaleAddresses(removable)
+            if numRemoved:
+                print("Removed {} stale addresses from {}.".format(numRemoved,
+                                                                   doc.path))
+        saved.append(doc.save())
+    return saved
+
+def makeDoc(csvPath, doc, clearStale=True, rejectsPath=None):
+    return makeDocs(csvPath, [doc], clearStale, rejectsPath)[0]
+
+#-----------------------------------------------------------------------------
+def addProfileArgs(parser):
+    parser.add_argument("--profile", action='store_true',
+                        help="print the time spent in each phase of the run")
+    parser.add_argument("--profile-json", metavar="PATH",
+                        help="write the phase times and counters to PATH")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="run under cProfile, saving the stats to PATH")
+
+def runProfiled(args, func, *funcArgs, **funcKwargs):
+    """Run func as the command line arguments say it should be profiled"""
+    if not (args.profile or args.profile_json or args.cprofile):
+        return func(*funcArgs, **funcKwargs)
+    Document.profile = profile = Profile()
+    try:
+        if args.cprofile:
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(func, *funcArgs, **funcKwargs)
+            finally:
+                prof.dump_stats(args.cprofile)
+        else:
+            return func(*funcArgs, **funcKwargs)
+    finally:
+        Document.profile = NullProfile()
+        if args.profile:
+            profile.report()
+        if args.profile_json:
+            profile.report(args.profile_json)
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
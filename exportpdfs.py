@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+import sys
+import os
+import json
+import time
+import shlex
+import argparse
+import threading
+import subprocess
+from queue import Queue, Empty
+from pathlib import Path
+from blisslib import hashFile
+
+#-----------------------------------------------------------------------------
+class Manifest:
+    """The content hashes of the SVGs as they were last exported"""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes = {}
+        if self.path.is_file():
+            with self.path.open("r") as fileIn:
+                self.hashes = json.load(fileIn)
+
+    def save(self):
+        tmpPath = self.path.with_name("{}.tmp".format(self.path.name))
+        with tmpPath.open("w") as fileOut:
+            json.dump(self.hashes, fileOut, indent=1, sort_keys=True)
+        os.replace(tmpPath, self.path)
+
+    def isChanged(self, svgPath, digest):
+        return self.hashes.get(str(svgPath)) != digest
+
+    def update(self, svgPath, digest):
+        self.hashes[str(svgPath)] = digest
+
+def pdfPathFor(svgPath):
+    return Path(svgPath).with_suffix(".pdf")
+
+#-----------------------------------------------------------------------------
+class ShellWorker:
+    """A persistent exporter shell, e.g. inkscape --shell, which reads one
+    command per line and prints a prompt when it is ready for the next"""
+    def __init__(self, exporter, cmdFormat, prompt):
+        self.cmdFormat = cmdFormat
+        self.prompt = prompt.encode()
+        self.proc = subprocess.Popen(shlex.split(exporter),
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL)
+        self._waitForPrompt()
+
+    def _waitForPrompt(self):
+        output = b""
+        while not output.endswith(self.prompt):
+            char = self.proc.stdout.read(1)
+            if not char:
+                raise RuntimeError("Exporter exited unexpectedly")
+            output += char
+            if char == b"\n":
+                output = b""
+
+    def export(self, svgPath, pdfPath):
+        cmd = self.cmdFormat.format(svg=svgPath, pdf=pdfPath)
+        self.proc.stdin.write(cmd.encode() + b"\n")
+        self.proc.stdin.flush()
+        self._waitForPrompt()
+
+    def close(self):
+        try:
+            self.proc.stdin.write(b"quit\n")
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+
+#-----------------------------------------------------------------------------
+class Exporter:
+    def __init__(self, manifestPath, exporter="inkscape --shell",
+                 cmdFormat="'{svg}' --export-pdf '{pdf}'", prompt=">",
+                 jobs=2):
+        self.manifest  = Manifest(manifestPath)
+        self.exporter  = exporter
+        self.cmdFormat = cmdFormat
+        self.prompt    = prompt
+        self.jobs      = jobs
+        self.lock      = threading.Lock()
+
+    def getChanged(self, svgPaths):
+        """The SVGs, with their hashes, which need exporting"""
+        changed = []
+        for svgPath in svgPaths:
+            if not Path(svgPath).is_file():
+                continue
+            digest = hashFile(svgPath)
+            if (self.manifest.isChanged(svgPath, digest) or
+                not pdfPathFor(svgPath).is_file()):
+                changed.append((svgPath, digest))
+        return changed
+
+    def export(self, svgPaths):
+        """Export the changed SVGs to PDF.  Returns a list of the
+        (svgPath, seconds) exported and a dict of svgPath to error."""
+        queue = Queue()
+        for item in self.getChanged(svgPaths):
+            queue.put(item)
+        exported = []
+        errors = {}
+        numWorkers = min(self.jobs, queue.qsize())
+        threads = [threading.Thread(target=self._work,
+                                    args=(queue, exported, errors))
+                   for _ in range(numWorkers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        while not queue.empty():
+            svgPath, digest = queue.get()
+            errors.setdefault(svgPath, "no exporter left to run it")
+        self.manifest.save()
+        return exported, errors
+
+    def _work(self, queue, exported, errors):
+        try:
+            worker = ShellWorker(self.exporter, self.cmdFormat, self.prompt)
+        except (OSError, RuntimeError) as err:
+            print("Could not start {}: {}".format(self.exporter, err))
+            return
+        try:
+            while True:
+                try:
+                    svgPath, digest = queue.get_nowait()
+                except Empty:
+                    break
+                pdfPath = pdfPathFor(svgPath)
+                started = time.perf_counter()
+                try:
+                    worker.export(svgPath, pdfPath)
+                except (OSError, RuntimeError) as err:
+                    with self.lock:
+                        errors[svgPath] = err
+                    break
+                seconds = time.perf_counter() - started
+                with self.lock:
+                    if (pdfPath.is_file() and
+                        pdfPath.stat().st_mtime >= Path(svgPath).stat().st_mtime):
+                        self.manifest.update(svgPath, digest)
+                        exported.append((svgPath, seconds))
+                        print("Exported {} in {:.2f}s".format(svgPath, seconds))
+                    else:
+                        errors[svgPath] = "no PDF was written"
+        finally:
+            worker.close()
+
+def exportPdfs(svgPaths, manifestPath, **kwargs):
+    exporter = Exporter(manifestPath, **kwargs)
+    exported, errors = exporter.export(svgPaths)
+    for svgPath, err in errors.items():
+        print("Exporting {} failed: {}".format(svgPath, err))
+    return exported, errors
+
+#-----------------------------------------------------------------------------
+def addExportArgs(parser):
+    parser.add_argument("--manifest", default=".export-manifest.json",
+                        help="where to keep the hashes of the exported SVGs")
+    parser.add_argument("--exporter", default="inkscape --shell",
+                        help="the exporter shell to run")
+    parser.add_argument("--export-cmd", default="'{svg}' --export-pdf '{pdf}'",
+                        help="the exporter command for each SVG")
+    parser.add_argument("--export-jobs", type=int, default=2,
+                        help="number of exporter shells to run at once")
+
+def exportKwargs(args):
+    return {'exporter':  args.exporter,
+            'cmdFormat': args.export_cmd,
+            'jobs':      args.export_jobs}
+
+def parseArgs(rawArgs):
+    parser = argparse.ArgumentParser(description=
+        "Export the SVGs which have changed to PDF")
+    addExportArgs(parser)
+    parser.add_argument("svgPaths", nargs="+", metavar="File.svg")
+    args = parser.parse_args(rawArgs)
+    return args
+
+#-----------------------------------------------------------------------------
+def main(rawArgs=sys.argv[1:]):
+    args = parseArgs(rawArgs)
+    exported, errors = exportPdfs(args.svgPaths, args.manifest,
+                                  **exportKwargs(args))
+    if errors:
+        sys.exit(1)
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
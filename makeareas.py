@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+import sys
+import os
+import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from blisslib import PagedDocument, makeDocs
+from makecdmap import Map
+from makecdlist import AddressList
+from exportpdfs import exportPdfs, addExportArgs, exportKwargs
+
+AREAS = ['Derrick Road',
+         'Kelseyton',
+         'Oakleyville',
+         'Robbins Creek',
+         'Pickle Street',
+         'Sessions Road',
+         'Timber Lake',
+         'Uptonville']
+
+#-----------------------------------------------------------------------------
+def selectAreas(tags, areas=AREAS):
+    # as update.sh did it, an area is selected if it matches the tags string
+    if not tags:
+        return list(areas)
+    tags = " ".join(tags)
+    return [area for area in areas if re.search(area, tags)]
+
+def areaSvgs(areas, maps=True, lists=True):
+    svgs = []
+    for area in areas:
+        if maps:
+            svgs += PagedDocument.getPagePaths("{} Map.svg".format(area))
+        if lists:
+            svgs += PagedDocument.getPagePaths("{} Addresses.svg".format(area))
+    return [str(svg) for svg in svgs]
+
+def areaDoc(docClass, path, pageSize=None, repaginate=False):
+    """The area's document, paged unless pageSize is 0.  A pageSize of
+    None leaves each kind of document its own pageCapacity."""
+    if pageSize == 0:
+        return docClass(path)
+    return PagedDocument(docClass, path, pageSize, repaginate)
+
+def areaDocs(area, maps=True, lists=True, pageSize=None, repaginate=False):
+    docs = []
+    if maps:
+        docs.append(areaDoc(Map, "{} Map.svg".format(area),
+                            pageSize, repaginate))
+    if lists:
+        docs.append(areaDoc(AddressList, "{} Addresses.svg".format(area),
+                            pageSize, repaginate))
+    return docs
+
+def updateArea(area, maps=True, lists=True, pageSize=None, repaginate=False):
+    docs = areaDocs(area, maps, lists, pageSize, repaginate)
+    if not docs:
+        return []
+    return makeDocs("{}.csv".format(area), docs)
+
+def updateAreas(areas, maps=True, lists=True, jobs=None, pageSize=None,
+                repaginate=False):
+    """Update the areas in parallel.  Returns a dict of area to error."""
+    errors = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {area: pool.submit(updateArea, area, maps, lists,
+                                     pageSize, repaginate)
+                   for area in areas}
+        for area, future in futures.items():
+            try:
+                future.result()
+            except Exception as err:
+                errors[area] = err
+    return errors
+
+#-----------------------------------------------------------------------------
+def addPageArgs(parser):
+    parser.add_argument("--page-size", type=int,
+                        help="addresses per page, or 0 for just one page, "
+                             "otherwise {} for maps and {} for address "
+                             "lists".format(Map.pageCapacity,
+                                            AddressList.pageCapacity))
+    parser.add_argument("--repaginate", action='store_true',
+                        help="move the addresses beyond the page size on "
+                             "existing pages to pages with room")
+
+def parseArgs(rawArgs):
+    parser = argparse.ArgumentParser(description=
+        "Make the maps and address lists for several areas")
+    parser.add_argument("-m", dest="lists", action='store_false',
+                        help="don't update the address lists")
+    parser.add_argument("-l", dest="maps", action='store_false',
+                        help="don't update the maps")
+    parser.add_argument("-n", action='store_true',
+                        help="don't update the maps or the address lists")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of areas to update at once")
+    parser.add_argument("-x", "--export", action='store_true',
+                        help="export the changed maps and lists to PDF")
+    parser.add_argument("--only-export", action='store_true',
+                        help="export to PDF without updating first")
+    addPageArgs(parser)
+    addExportArgs(parser)
+    parser.add_argument("tags", nargs="*", metavar="area",
+                        help="only update those areas specified")
+    args = parser.parse_args(rawArgs)
+    if args.n:
+        args.maps = args.lists = False
+    return args
+
+#-----------------------------------------------------------------------------
+def main(rawArgs=sys.argv[1:]):
+    args = parseArgs(rawArgs)
+    areas = selectAreas(args.tags)
+    errors = {}
+    if not args.only_export:
+        errors = updateAreas(areas, args.maps, args.lists, args.jobs,
+                             args.page_size, args.repaginate)
+        for area, err in errors.items():
+            print("Updating {} failed: {}".format(area, err))
+    if args.export or args.only_export:
+        svgs = areaSvgs(areas, args.maps, args.lists)
+        exported, exportErrors = exportPdfs(svgs, args.manifest,
+                                            **exportKwargs(args))
+        errors.update(exportErrors)
+    if errors:
+        sys.exit(1)
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
@@ -3,25 +3,23 @@
 #-----------------------------------------------------------------------------
 import sys
 import argparse
-from blisslib import SVG, Document, Address, makeDoc
+from blisslib import SVG, Document, PagedDocument, makeDoc
+from blisslib import addProfileArgs, runProfiled
 
 #-----------------------------------------------------------------------------
 class AddressList(Document):
+    pageCapacity = 38
+    slotOrigin = (8.5, 38)          # where the first row goes
+    slotStep   = 6.4                # the spacing of the rows
+
     def __init__(self, path):
+        self.slots = None
         super().__init__(path)
-        self.nextX = 8.5
-        self.nextY = 38
-
-    def _updateAddress(self, address, row):
-        address.data = row
-        self._updateDetails(address)
-        self._updateOccupancy(address)
 
-    def _createAddress(self, row):
-        xml = """
+    addressXml = """
     <g
-       transform="translate({1}, {2})"
-       inkscape:label="{0[rapid]}">
+       transform="translate(0, 0)"
+       inkscape:label="">
       <use
          height="100%"
          width="100%"
@@ -34,12 +32,12 @@ class AddressList(Document):
          style="font-style:normal;font-variant:normal;font-weight:normal;font-stretch:normal;font-size:2.82222223px;font-family:Overpass;-inkscape-font-specification:'Overpass, Normal';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:center;writing-mode:lr-tb;text-anchor:middle;stroke-width:0.26458332"
          x="171.54761"
          y="1.2784872"
-         inkscape:label="textRAPID">{0[rapid]}</text>
+         inkscape:label="textRAPID"></text>
       <text
          style="font-style:normal;font-variant:normal;font-weight:bold;font-stretch:normal;font-size:5.64444447px;font-family:Overpass;-inkscape-font-specification:'Overpass, Bold';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:start;writing-mode:lr-tb;text-anchor:start"
          x="9.8367767"
          y="2.2662649"
-         inkscape:label="textNumber">{0[number]}</text>
+         inkscape:label="textNumber"></text>
       <text
          style="font-style:normal;font-variant:normal;font-weight:normal;font-stretch:normal;font-size:3.88055563px;line-height:1.25;font-family:'Liberation Serif';-inkscape-font-specification:'Liberation Serif, Normal';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:start;letter-spacing:0px;word-spacing:0px;writing-mode:lr-tb;text-anchor:start;fill:#000000;fill-opacity:1;stroke:none;stroke-width:0.26458332"
          x="96.377472"
@@ -53,39 +51,97 @@ class AddressList(Document):
          inkscape:label="textNames"
          xml:space="preserve"></text>
     </g>
-        """.format(row, self.nextX, self.nextY)
-        element = SVG.Element.fromstring(xml)
-        self.layer.append(element)
-        self.nextY += 6.4
-        address = Address(element, row)
+        """
+
+    def _updateAddress(self, address, row):
+        address.data = row
+        self._updateDetails(address)
+        self._updateOccupancy(address)
+
+    def _createAddress(self, row):
+        x, y = self._nextFreeSlot()
+        address = self._cloneAddress(row, x, y)
         self._updateDetails(address)
         self._updateOccupancy(address)
         return address
 
+    def load(self):
+        super().load()
+        self.slots = None
+
+    def new(self, landscape):
+        super().new(landscape)
+        self.slots = None
+
+    def copyBase(self, other):
+        super().copyBase(other)
+        self.slots = None
+
+    def _indexSlots(self):
+        # the rows taken by the groups as they are now, including any
+        # left by stale addresses or moved by hand in Inkscape
+        originX, originY = self.slotOrigin
+        self.slots = set()
+        self.slot = 0
+        self.slotY = originY
+        for group in self.layer.findall("svg:g"):
+            x, y = SVG.getOffset(group)
+            self.slots.add(round((y - originY) / self.slotStep))
+
+    def _nextFreeSlot(self):
+        if self.slots is None:
+            self._indexSlots()
+        originX, originY = self.slotOrigin
+        while True:
+            slot, y = self.slot, self.slotY
+            self.slot += 1
+            self.slotY += self.slotStep
+            if slot not in self.slots:
+                self.slots.add(slot)
+                return originX, y
+
     def _updateDetails(self, address):
-        names = address.element.find("svg:text[@inkscape:label='textNames']")
+        names = address.part("textNames")
         names = self._textOrTspan(names)
-        names.text = address.names
-        phone = address.element.find("svg:text[@inkscape:label='textPhone']")
+        self._setText(names, address.names)
+        phone = address.part("textPhone")
         phone = self._textOrTspan(phone)
-        phone.text = address.phone
+        self._setText(phone, address.phone)
 
 #-----------------------------------------------------------------------------
 def parseArgs(rawArgs):
     parser = argparse.ArgumentParser(description="Make an address list")
     parser.add_argument("--no-deletes", action='store_true',
                        help="leave stale addresses on the list")
+    parser.add_argument("--page-size", type=int,
+                        default=AddressList.pageCapacity,
+                        help="addresses per page, or 0 for just one page")
+    parser.add_argument("--repaginate", action='store_true',
+                        help="move the addresses beyond the page size on "
+                             "existing pages to pages with room")
+    parser.add_argument("--rejects", metavar="Rejects.csv",
+                        help="where to report the rows which were skipped")
+    addProfileArgs(parser)
     parser.add_argument("inpath", metavar="Addresses.csv")
     parser.add_argument("outpath", metavar="AddressList.svg",
                         nargs="?", default="list.svg")
     args = parser.parse_args(rawArgs)
     return args
 
+#-----------------------------------------------------------------------------
+def makeList(args):
+    if args.page_size:
+        addrs = PagedDocument(AddressList, args.outpath, args.page_size,
+                              args.repaginate)
+    else:
+        addrs = AddressList(args.outpath)
+    return makeDoc(args.inpath, addrs, clearStale=not args.no_deletes,
+                   rejectsPath=args.rejects)
+
 #-----------------------------------------------------------------------------
 def main(rawArgs=sys.argv[1:]):
     args = parseArgs(rawArgs)
-    addrs = AddressList(args.outpath)
-    makeDoc(args.inpath, addrs, clearStale=not args.no_deletes)
+    runProfiled(args, makeList, args)
 
 #-----------------------------------------------------------------------------
 if __name__ == "__main__":
@@ -3,25 +3,29 @@
 #-----------------------------------------------------------------------------
 import sys
 import argparse
-from blisslib import SVG, Document, Address, makeDoc
+from blisslib import SVG, Document, PagedDocument, SpatialGrid, makeDoc
+from blisslib import addProfileArgs, runProfiled
 
 #-----------------------------------------------------------------------------
 class Map(Document):
+    pageCapacity = 96
+    slotOrigin = (5, 5)             # where the first label box goes
+    slotStep   = (25, 20)           # the grid new label boxes are put on
+    boxBounds  = (1, -0.1, 24.3, 17.5)  # extent of a group about its origin
+
     def __init__(self, path, landscape=False):
+        self.boxes = None
         super().__init__(path, landscape)
-        widthAttr = self.tree.getroot().get('width')
-        self.pageWidth = int("".join(d for d in widthAttr if d.isdigit()))
 
-    def _updateAddress(self, address, row):
-        address.data = row
-        self._updateDetails(address)
-        self._updateOccupancy(address)
+    @property
+    def pageWidth(self):
+        widthAttr = self.tree.getroot().get('width')
+        return int("".join(d for d in widthAttr if d.isdigit()))
 
-    def _createAddress(self, row):
-        xml = """
+    addressXml = """
     <g
-       transform="translate({1}, {2})"
-       inkscape:label="{0[rapid]}">
+       transform="translate(0, 0)"
+       inkscape:label="">
       <path
          d="M 1.07721,5.949556 9.1092,2.642264"
          style="fill:none;fill-opacity:0.9875;stroke:#000000;stroke-width:0.16500001;stroke-linecap:butt;stroke-linejoin:miter;stroke-miterlimit:4;stroke-dasharray:none;stroke-opacity:1;marker-start:url(#DotL)"
@@ -46,12 +50,12 @@ class Map(Document):
          style="font-style:normal;font-variant:normal;font-weight:normal;font-stretch:normal;font-size:1.05833328px;font-family:Overpass;-inkscape-font-specification:'Overpass, Normal';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:center;writing-mode:lr-tb;text-anchor:middle;stroke-width:0.26458332"
          x="16.529512"
          y="1.397404"
-         inkscape:label="textRAPID">{0[rapid]}</text>
+         inkscape:label="textRAPID"></text>
       <text
          style="font-style:normal;font-variant:normal;font-weight:bold;font-stretch:normal;font-size:4.23333311px;font-family:Overpass;-inkscape-font-specification:'Overpass, Bold';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:start;writing-mode:lr-tb;text-anchor:start"
          x="10.53698"
          y="5"
-         inkscape:label="textNumber">{0[number]}</text>
+         inkscape:label="textNumber"></text>
       <text
          style="font-style:normal;font-variant:normal;font-weight:normal;font-stretch:normal;font-size:1.76388889px;line-height:1.25;font-family:'Liberation Serif';-inkscape-font-specification:'Liberation Serif, Normal';font-variant-ligatures:normal;font-variant-caps:normal;font-variant-numeric:normal;font-feature-settings:normal;text-align:start;letter-spacing:0px;word-spacing:0px;writing-mode:lr-tb;text-anchor:start;fill:#000000;fill-opacity:1;stroke:none;stroke-width:0.26458332"
          x="9.6093454"
@@ -59,21 +63,61 @@ class Map(Document):
          inkscape:label="textDetails"
          xml:space="preserve"></text>
     </g>
-        """.format(row, self.nextX, self.nextY)
-        element = SVG.Element.fromstring(xml)
-        self.layer.append(element)
-        self.nextX += 25
-
-        if self.nextX > self.pageWidth - 25:
-            self.nextX = 5
-            self.nextY += 20
-        address = Address(element, row)
+        """
+
+    def _updateAddress(self, address, row):
+        address.data = row
+        self._updateDetails(address)
+        self._updateOccupancy(address)
+
+    def _createAddress(self, row):
+        x, y = self._nextFreeSlot()
+        address = self._cloneAddress(row, x, y)
         self._updateDetails(address)
         self._updateOccupancy(address)
         return address
 
+    def load(self):
+        super().load()
+        self.boxes = None
+
+    def new(self, landscape):
+        super().new(landscape)
+        self.boxes = None
+
+    def copyBase(self, other):
+        super().copyBase(other)
+        self.boxes = None
+
+    def _boxAt(self, x, y):
+        x0, y0, x1, y1 = self.boxBounds
+        return (x + x0, y + y0, x + x1, y + y1)
+
+    def _indexBoxes(self):
+        # where the groups are now, including any moved by hand in Inkscape
+        self.boxes = SpatialGrid(*self.slotStep)
+        self.slot = 0
+        for group in self.layer.findall("svg:g"):
+            self.boxes.insert(self._boxAt(*SVG.getOffset(group)))
+
+    def _nextFreeSlot(self):
+        if self.boxes is None:
+            self._indexBoxes()
+        originX, originY = self.slotOrigin
+        stepX, stepY = self.slotStep
+        numColumns = max(1, (self.pageWidth - stepX - originX) // stepX + 1)
+        while True:
+            row, col = divmod(self.slot, numColumns)
+            x = originX + col * stepX
+            y = originY + row * stepY
+            self.slot += 1
+            box = self._boxAt(x, y)
+            if not self.boxes.overlaps(box):
+                self.boxes.insert(box)
+                return x, y
+
     def _updateDetails(self, address):
-        text = address.element.find("svg:text[@inkscape:label='textDetails']")
+        text = address.part("textDetails")
         textContent = " ".join(txt.strip() for txt in text.itertext())
         dtlContent  = " ".join(dtl for dtl in address.details if dtl)
         if textContent == dtlContent:
@@ -82,6 +126,7 @@ class Map(Document):
                    'y': text.get('y'),
                    'sodipodi:role': "line"}
         text[:] = []       # clear old tspans
+        self.modified = True
         y = float(attribs['y'])
         for dtl in address.details:
             tspan = SVG.SubElement(text, "svg:tspan", attribs)
@@ -96,17 +141,35 @@ def parseArgs(rawArgs):
                        help="default to landscape pages")
     parser.add_argument("--no-deletes", action='store_true',
                        help="leave stale addresses on the map")
+    parser.add_argument("--page-size", type=int,
+                        default=Map.pageCapacity,
+                        help="addresses per page, or 0 for just one page")
+    parser.add_argument("--repaginate", action='store_true',
+                        help="move the addresses beyond the page size on "
+                             "existing pages to pages with room")
+    parser.add_argument("--rejects", metavar="Rejects.csv",
+                        help="where to report the rows which were skipped")
+    addProfileArgs(parser)
     parser.add_argument("inpath", metavar="Addresses.csv")
     parser.add_argument("outpath", metavar="Map.svg",
                         nargs="?", default="map.svg")
     args = parser.parse_args(rawArgs)
     return args
 
+#-----------------------------------------------------------------------------
+def makeMap(args):
+    if args.page_size:
+        map = PagedDocument(Map, args.outpath, args.page_size,
+                            args.repaginate, landscape=args.landscape)
+    else:
+        map = Map(args.outpath, args.landscape)
+    return makeDoc(args.inpath, map, clearStale=not args.no_deletes,
+                   rejectsPath=args.rejects)
+
 #-----------------------------------------------------------------------------
 def main(rawArgs=sys.argv[1:]):
     args = parseArgs(rawArgs)
-    map = Map(args.outpath, args.landscape)
-    makeDoc(args.inpath, map, clearStale=not args.no_deletes)
+    runProfiled(args, makeMap, args)
 
 #-----------------------------------------------------------------------------
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Refresh the area maps and address lists straight from a PRID PDF, in one
+# pass over the PDF and without going through the per area CSV files
+#-----------------------------------------------------------------------------
+import sys
+import csv
+import time
+import argparse
+from pathlib import Path
+from blisslib import Document, NullProfile, AddressReader, saveDocs
+from blisslib import addProfileArgs, runProfiled
+from makeareas import areaDocs, addPageArgs
+from plumbprid import RatingInformation, addPlumbArgs, plumbKwargs
+from plumbprid import reportStreaming
+
+ContactFields = ('names', 'phone', 'occupancy')
+
+#-----------------------------------------------------------------------------
+def loadAreaTable(path):
+    """Read a CSV of postcode,area pairs into a dict of postcode to area"""
+    with open(path, "r", newline='') as csvFile:
+        return {row['postcode'].strip(): row['area'].strip()
+                for row in csv.DictReader(csvFile)
+                if row.get('postcode') and row.get('area')}
+
+def addressKey(number, address):
+    """How a PRID row is matched up with a row of an area's CSV"""
+    return (number.strip(), " ".join(address.split()).lower())
+
+def loadContacts(area):
+    """The rows of the area's addresses CSV, if there is one, by their
+    addressKey"""
+    csvPath = Path("{}.csv".format(area))
+    if not csvPath.is_file():
+        return {}
+    contacts = {}
+    # counted apart from the PRID rows
+    for row in AddressReader(csvPath, NullProfile()):
+        number, address = row.get('number'), row.get('address')
+        if number and address:
+            contacts.setdefault(addressKey(number, address), row)
+    Document.profile.count("contact rows", len(contacts))
+    return contacts
+
+def addressRow(pridRow, rapid, contact=None):
+    """A row for Document.addAddress from a plumbed PRID row.  The PRID
+    doesn't know who lives where, so the names, phone and occupancy come
+    from the area's contacts, where they have them."""
+    row = {'rapid':     rapid,
+           'number':    pridRow['number'],
+           'address':   pridRow['address'],
+           'names':     "",
+           'phone':     "",
+           'occupancy': ""}
+    if contact is not None:
+        for field in ContactFields:
+            value = contact.get(field)
+            if value:
+                row[field] = value
+    return row
+
+#-----------------------------------------------------------------------------
+class AreaUpdate:
+    """An area's documents being refreshed from the plumbed rows.  The PRID
+    has no RAPIDs, so they come from the area's CSV by number and address.
+    Addresses not in the CSV use their number as the RAPID, if no other
+    address has it."""
+    def __init__(self, area, maps=True, lists=True, contacts=True,
+                 pageSize=None, repaginate=False):
+        self.area       = area
+        self.docs       = areaDocs(area, maps, lists, pageSize, repaginate)
+        self.contacts   = loadContacts(area) if contacts else {}
+        self.rapids     = {row['rapid'] for row in self.contacts.values()}
+        self.seen       = set()
+        self.used       = set()
+        self.unnumbered = 0
+        self.clashes    = 0
+
+    def addAddress(self, pridRow):
+        number = pridRow['number']
+        if not number:
+            self.unnumbered += 1
+            Document.profile.count("rows unnumbered")
+            return
+        key = addressKey(number, pridRow['address'])
+        if key in self.seen:
+            # another title of an address already added
+            return
+        self.seen.add(key)
+        contact = self.contacts.get(key)
+        if contact is not None:
+            rapid = contact['rapid']
+        elif number in self.rapids or number in self.used:
+            self.clashes += 1
+            Document.profile.count("RAPID clashes")
+            return
+        else:
+            rapid = number
+        self.used.add(rapid)
+        row = addressRow(pridRow, rapid, contact)
+        for doc in self.docs:
+            doc.addAddress(row)
+
+def plumbMaps(pdfPath, areaTable=None, maps=True, lists=True, contacts=True,
+              clearStale=True, pageSize=None, repaginate=False,
+              **pridKwargs):
+    """Refresh the documents of every area with addresses in the PDF.
+    Areas are the postcodes, or what areaTable maps them to; postcodes
+    missing from areaTable are left out.  Returns the RatingInformation
+    for its counts."""
+    profile = Document.profile
+    updates = {}
+    with RatingInformation(pdfPath, **pridKwargs) as prid:
+        rows = prid.getAddresses()
+        while True:
+            with profile.phase("plumb"):
+                row = next(rows, None)
+            if row is None:
+                break
+            profile.count("PRID rows")
+            postcode = row['postcode']
+            if areaTable is None:
+                area = postcode
+            else:
+                area = areaTable.get(postcode)
+            if not area:
+                profile.count("rows not in area")
+                continue
+            update = updates.get(area)
+            if update is None:
+                update = AreaUpdate(area, maps, lists, contacts,
+                                    pageSize, repaginate)
+                updates[area] = update
+            update.addAddress(row)
+    for area, update in updates.items():
+        if update.unnumbered:
+            print("Skipped {} rows for {} with no number."
+                  .format(update.unnumbered, area))
+        if update.clashes:
+            print("Skipped {} addresses for {} not in {}.csv, whose numbers "
+                  "are other addresses' RAPIDs."
+                  .format(update.clashes, area, area))
+        # only the addresses the CSV lets us match up with the PRID can be
+        # known to be gone from it
+        saved = saveDocs(update.docs, clearStale, update.rapids)
+        profile.count("documents saved", sum(saved))
+    return prid
+
+#-----------------------------------------------------------------------------
+def parseArgs(rawArgs):
+    parser = argparse.ArgumentParser(description=
+        "Make the maps and address lists for each area from a PRID PDF")
+    parser.add_argument("--areas", metavar="Areas.csv",
+                        help="postcode,area table, otherwise each postcode "
+                             "is its own area")
+    parser.add_argument("-m", dest="lists", action='store_false',
+                        help="don't update the address lists")
+    parser.add_argument("-l", dest="maps", action='store_false',
+                        help="don't update the maps")
+    parser.add_argument("--no-contacts", dest="contacts",
+                        action='store_false',
+                        help="don't take names, phones and occupancy from "
+                             "the area CSV files")
+    parser.add_argument("--no-deletes", action='store_true',
+                        help="leave stale addresses on the maps and lists")
+    addPageArgs(parser)
+    addPlumbArgs(parser)
+    addProfileArgs(parser)
+    parser.add_argument("inpath", metavar="PRIDFile.pdf")
+    args = parser.parse_args(rawArgs)
+    return args
+
+#-----------------------------------------------------------------------------
+def main(rawArgs=sys.argv[1:]):
+    args = parseArgs(rawArgs)
+    areaTable = loadAreaTable(args.areas) if args.areas else None
+    kwargs = plumbKwargs(args)
+    # only some of the pages can't tell us which addresses are stale
+    clearStale = not args.no_deletes and args.pages is None
+    started = time.perf_counter()
+    prid = runProfiled(args, plumbMaps, args.inpath, areaTable,
+                       args.maps, args.lists, args.contacts, clearStale,
+                       args.page_size, args.repaginate, **kwargs)
+    seconds = time.perf_counter() - started
+    if kwargs['cache']:
+        kwargs['cache'].evict()
+    if args.stream:
+        reportStreaming(prid, seconds)
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
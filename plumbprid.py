@@ -1,11 +1,26 @@
 #!/usr/bin/env python
 import sys
+import os
+import json
+import time
+import resource
+import hashlib
+import sqlite3
 import argparse
+from bisect import bisect
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from itertools import chain
 from decimal import Decimal
 from contextlib import AbstractContextManager
+from pathlib import Path
 from pdfplumber import PDF
-from csv import DictWriter
+from pdfplumber.page import Page
+from pdfminer.pdfpage import PDFPage
+from pdfplumber.utils import cluster_objects
+from pdfminer.pdftypes import PDFObjRef, PDFStream, stream_value
+from csv import DictReader, DictWriter
+from blisslib import hashFile
 
 class CloserMixin(AbstractContextManager):
     def __enter__(self):
@@ -34,11 +49,325 @@ class AddressWriter(DictWriter, CloserMixin):
             self.fileOut = open(path, "w", newline='')
         super().__init__(self.fileOut, self.fields, extrasaction="ignore")
 
+    def flush(self):
+        self.fileOut.flush()
+
     def close(self):
         if self.fileOut is not sys.stdout:
             self.fileOut.close()
 
 
+class JsonLinesWriter(CloserMixin):
+    """Writes the addresses one JSON object per line, flushed at the end of
+    each page so a partial run still leaves whole pages behind"""
+    fields = AddressWriter.fields
+
+    def __init__(self, path):
+        if path == "-":
+            self.fileOut = sys.stdout
+        else:
+            self.fileOut = open(path, "w")
+        self.pageNum = None
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, row):
+        if row['page#'] != self.pageNum:
+            self.fileOut.flush()
+            self.pageNum = row['page#']
+        record = {field: row.get(field) for field in self.fields}
+        self.fileOut.write(json.dumps(record) + "\n")
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        self.fileOut.flush()
+
+    def close(self):
+        self.fileOut.flush()
+        if self.fileOut is not sys.stdout:
+            self.fileOut.close()
+
+
+class SqliteWriter(CloserMixin):
+    """Writes the addresses to an SQLite table, a page or batch per
+    transaction, indexed by postcode, assessment# and valuation#"""
+    fields    = AddressWriter.fields
+    indexed   = ['postcode', 'assessment#', 'valuation#']
+    table     = "addresses"
+    batchSize = 1000
+
+    def __init__(self, path):
+        if path == "-":
+            raise ValueError("Can't write SQLite to stdout")
+        self.db = sqlite3.connect(path)
+        self.batch = []
+        self.pageNum = None
+
+    def writeheader(self):
+        columns = ", ".join('"{}" {}'.format(field,
+                                             "INTEGER" if field == 'page#'
+                                             else "TEXT")
+                            for field in self.fields)
+        with self.db:
+            self.db.execute('DROP TABLE IF EXISTS "{}"'.format(self.table))
+            self.db.execute('CREATE TABLE "{}" ({})'.format(self.table,
+                                                           columns))
+
+    def writerow(self, row):
+        if (row['page#'] != self.pageNum or
+            len(self.batch) >= self.batchSize):
+            self.flush()
+            self.pageNum = row['page#']
+        self.batch.append([row.get(field) for field in self.fields])
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self.batch:
+            insert = 'INSERT INTO "{}" VALUES ({})'.format(self.table,
+                                        ", ".join("?" * len(self.fields)))
+            with self.db:
+                self.db.executemany(insert, self.batch)
+            self.batch = []
+
+    def close(self):
+        try:
+            self.flush()
+            # building the indexes after the inserts is quicker than
+            # keeping them up to date along the way
+            with self.db:
+                for field in self.indexed:
+                    name = "{}_{}".format(self.table, field.strip("#"))
+                    self.db.execute('CREATE INDEX IF NOT EXISTS "{}" '
+                                    'ON "{}" ("{}")'.format(name, self.table,
+                                                            field))
+        finally:
+            self.db.close()
+
+
+Writers = {'csv':    AddressWriter,
+           'jsonl':  JsonLinesWriter,
+           'sqlite': SqliteWriter}
+Extensions = {'.csv':     'csv',
+              '.jsonl':   'jsonl',
+              '.ndjson':  'jsonl',
+              '.db':      'sqlite',
+              '.sqlite':  'sqlite',
+              '.sqlite3': 'sqlite'}
+
+def formatFor(path, format=None):
+    if format is None:
+        format = Extensions.get(Path(path).suffix.lower(), 'csv')
+    return format
+
+def openWriter(path, format=None):
+    return Writers[formatFor(path, format)](path)
+
+def readAddresses(path, format=None):
+    """Read back the addresses written by one of the Writers"""
+    format = formatFor(path, format)
+    if format == 'sqlite':
+        db = sqlite3.connect(path)
+        db.row_factory = sqlite3.Row
+        try:
+            rows = [dict(row) for row in
+                    db.execute('SELECT * FROM "{}"'.format(SqliteWriter.table))]
+        finally:
+            db.close()
+    elif format == 'jsonl':
+        with open(path, "r") as fileIn:
+            rows = [json.loads(line) for line in fileIn if line.strip()]
+    else:
+        with open(path, "r", newline='') as fileIn:
+            rows = list(DictReader(fileIn))
+    for row in rows:
+        row['page#'] = int(row['page#'])
+    return rows
+
+
+class DeltaWriter(AddressWriter):
+    fields = ['change'] + AddressWriter.fields
+
+
+def diffEditions(oldRows, newRows):
+    """The rows added, removed or changed between two editions"""
+    def keyed(rows):
+        # an assessment can cover several titles, and a title several
+        # addresses, so count the repeats to keep the keys unique
+        byKey = {}
+        for row in rows:
+            key = (row['valuation#'], row['title'])
+            num = 0
+            while key + (num,) in byKey:
+                num += 1
+            byKey[key + (num,)] = row
+        return byKey
+
+    def differs(oldRow, newRow):
+        return any(str(oldRow.get(field, "")) != str(newRow.get(field, ""))
+                   for field in AddressWriter.fields if field != 'page#')
+
+    oldByKey = keyed(oldRows)
+    newByKey = keyed(newRows)
+    for key, row in newByKey.items():
+        if key not in oldByKey:
+            yield dict(row, change="added")
+        elif differs(oldByKey[key], row):
+            yield dict(row, change="changed")
+    for key, row in oldByKey.items():
+        if key not in newByKey:
+            yield dict(row, change="removed")
+
+
+def manifestPathFor(outPath):
+    return Path("{}.pages.json".format(outPath))
+
+def saveManifest(path, fingerprints, postcode=None):
+    manifest = {'postcode': postcode,
+                'pages':    {str(pageNum): fingerprint
+                             for pageNum, fingerprint in fingerprints.items()}}
+    tmpPath = path.with_name("{}.tmp".format(path.name))
+    with tmpPath.open("w") as fileOut:
+        json.dump(manifest, fileOut, indent=1)
+    os.replace(tmpPath, path)
+
+def fingerprintPage(page):
+    """A hash of the page's content streams and the resources they draw
+    with, such as the fonts and their ToUnicode maps, which can be had
+    without laying the page out"""
+    digest = hashlib.sha1()
+    for stream in page.page_obj.contents:
+        digest.update(stream_value(stream).get_data())
+    _hashPdfObject(digest, page.page_obj.resources, {})
+    return digest.hexdigest()
+
+def _hashPdfObject(digest, obj, seen):
+    # indirect objects are hashed the first time they are reached and
+    # then by the order they were reached in, not their object numbers,
+    # which another edition can number differently
+    if isinstance(obj, PDFObjRef):
+        if obj.objid in seen:
+            digest.update(b"R%d" % seen[obj.objid])
+            return
+        seen[obj.objid] = len(seen)
+        obj = obj.resolve()
+    if isinstance(obj, PDFStream):
+        _hashPdfObject(digest, obj.attrs, seen)
+        digest.update(b"S%d:" % len(obj.get_data()))
+        digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        digest.update(b"<<")
+        for key in sorted(obj):
+            digest.update(repr(key).encode())
+            _hashPdfObject(digest, obj[key], seen)
+        digest.update(b">>")
+    elif isinstance(obj, list):
+        digest.update(b"[")
+        for item in obj:
+            _hashPdfObject(digest, item, seen)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode())
+
+
+class PreviousEdition:
+    """The output of plumbing the last PRID edition, and the page
+    fingerprints it was plumbed from, so unchanged pages can be reused"""
+    def __init__(self, outPath, postcode=None, format=None):
+        self.rows = readAddresses(outPath, format)
+        self.pageRows = {}
+        for row in self.rows:
+            self.pageRows.setdefault(row['page#'], []).append(row)
+        self.pageNums = {}
+        manifestPath = manifestPathFor(outPath)
+        try:
+            with manifestPath.open("r") as fileIn:
+                manifest = json.load(fileIn)
+        except (OSError, ValueError) as err:
+            print("Can't reuse {}: {}".format(outPath, err), file=sys.stderr)
+            return
+        if manifest.get('postcode') != postcode:
+            print("Can't reuse {}: it was for postcode {}"
+                  .format(outPath, manifest.get('postcode')), file=sys.stderr)
+            return
+        for pageNum, fingerprint in manifest['pages'].items():
+            self.pageNums[fingerprint] = int(pageNum)
+
+    def getRows(self, fingerprint, pageNum):
+        """The rows of the previous page with this fingerprint, moved to
+        pageNum, or None if there was no such page"""
+        oldPageNum = self.pageNums.get(fingerprint)
+        if oldPageNum is None:
+            return None
+        return [dict(row, **{'page#': pageNum})
+                for row in self.pageRows.get(oldPageNum, [])]
+
+
+class PageCache:
+    """The rows plumbed from each page of a PDF, kept on disk under the
+    PDF's content hash, least recently used first out"""
+    version = 1
+
+    def __init__(self, cacheDir, digest, maxBytes=200 << 20):
+        self.dir      = Path(cacheDir).expanduser()
+        self.pdfDir   = self.dir / "{}-v{}".format(digest, self.version)
+        self.maxBytes = maxBytes
+
+    def _pagePath(self, pageNum):
+        return self.pdfDir / "{}.json".format(pageNum)
+
+    def get(self, pageNum):
+        path = self._pagePath(pageNum)
+        try:
+            with path.open("r") as fileIn:
+                rows = json.load(fileIn)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return rows
+
+    def put(self, pageNum, rows):
+        path = self._pagePath(pageNum)
+        tmpPath = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+        try:
+            self.pdfDir.mkdir(parents=True, exist_ok=True)
+            with tmpPath.open("w") as fileOut:
+                json.dump(rows, fileOut)
+            os.replace(tmpPath, path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used pages until the cache fits"""
+        if not self.dir.is_dir():
+            return
+        entries = []
+        for path in self.dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        for pdfDir in self.dir.iterdir():
+            if pdfDir.is_dir() and not any(pdfDir.iterdir()):
+                pdfDir.rmdir()
+
+
 class AssessmentRecord:
     HeadingVLines = [  21,  115,    # Rates Assessment:
                       182,  280,    # Valuation Number:
@@ -53,20 +382,32 @@ class AssessmentRecord:
                       560,    # area
                       634]
 
-    def __init__(self, page, top, bottom):
+    HeadingCols = (1, 3, 5, 7)   # the cells holding the values
+
+    lineTolerance = 3
+
+    def __init__(self, page, top, bottom, words=()):
         self.page   = page
         self.top    = top
         self.bottom = bottom
+        self.words  = self.getRecordWords(words, top, bottom)
         self.info   = self._getHeader()
 
+    @classmethod
+    def getRecordWords(cls, words, top, bottom):
+        """The words of the record whose "Rates" heading is at top.  The
+        rest of the heading can sit a little higher than that word."""
+        top    -= cls.lineTolerance
+        bottom -= cls.lineTolerance
+        return [word for word in words if top <= word['top'] < bottom]
+
     def _getHeader(self):
-        box = (self.HeadingVLines[0], self.top,
+        box = (self.HeadingVLines[0], self.top - self.lineTolerance,
                self.HeadingVLines[-1], self.top + 12)
-        header = self.page.crop(box)
-        tblSettings = {'vertical_strategy': "explicit",
-                       'explicit_vertical_lines': self.HeadingVLines,
-                       'horizontal_strategy': "text"}
-        row = header.extract_table(tblSettings)[0]
+        rows = self._getWordRows(box, self.HeadingVLines)
+        if not rows or not all(rows[0][col] for col in self.HeadingCols):
+            rows = self._getTableRows(box, self.HeadingVLines)
+        row = rows[0]
         info = {'page#':        self.page.page_number,
                 'assessment#':  row[1],
                 'valuation#':   row[3],
@@ -77,11 +418,8 @@ class AssessmentRecord:
     def getAddressRows(self):
         box = (self.AddressVLines[0], self.top + 28,
                self.AddressVLines[-1], self.bottom)
-        section = self.page.crop(box)
-        tblSettings = {'vertical_strategy': "explicit",
-                       'explicit_vertical_lines': self.AddressVLines,
-                       'horizontal_strategy': "text"}
-        tbl = section.extract_table(tblSettings)
+        tbl = (self._getWordRows(box, self.AddressVLines) or
+               self._getTableRows(box, self.AddressVLines))
         for row in tbl[1:]:
             addrParts = row[1].split(maxsplit=1)
             if len(addrParts) == 2 and addrParts[0][0].isdigit():
@@ -98,68 +436,294 @@ class AssessmentRecord:
             info.update(self.info)
             yield info
 
+    def _getWordRows(self, box, vLines):
+        """Bucket the page's words within box into lines and then into the
+        columns between vLines.  Returns None if any word straddles a
+        column line, leaving it to the table finder to split."""
+        x0, top, x1, bottom = box
+        words = [word for word in self.words
+                 if top <= word['top'] < bottom and
+                    word['x1'] > x0 and word['x0'] < x1]
+        rows = []
+        for line in cluster_objects(words, "top", self.lineTolerance):
+            cells = [[] for _ in vLines[1:]]
+            for word in sorted(line, key=itemgetter('x0')):
+                col = bisect(vLines, word['x0']) - 1
+                if not 0 <= col < len(cells) or word['x1'] > vLines[col + 1]:
+                    return None
+                cells[col].append(word['text'])
+            rows.append([" ".join(cell) for cell in cells])
+        return rows
+
+    def _getTableRows(self, box, vLines):
+        section = self.page.crop(box)
+        tblSettings = {'vertical_strategy': "explicit",
+                       'explicit_vertical_lines': vLines,
+                       'horizontal_strategy': "text"}
+        return section.extract_table(tblSettings)
+
 
 class RatingInformation(CloserMixin):
-    def __init__(self, path, postcode=None, pages=None):
-        self.postcode = postcode
+    chunksPerJob = 4
+
+    def __init__(self, path, postcode=None, pages=None, jobs=None,
+                 cache=None, streaming=False, previous=None,
+                 fingerprint=False):
+        self.path      = path
+        self.postcode  = postcode
+        self.pages     = pages
+        self.jobs      = jobs
+        self.cache     = cache
+        self.streaming = streaming
+        self.previous  = previous
+        self.fingerprints = {} if fingerprint or previous else None
+        self.pagesDone   = 0
+        self.pagesReused = 0
         self.pdf = PDF.open(path, pages=pages)
 
     def close(self):
         self.pdf.close()
 
     def getAddresses(self, postcode=None):
-        for page in self.pdf.pages:
-            for record in self._getAssessmentRecords(page):
-                for row in record.getAddressRows():
-                    if self.postcode in (None, row['postcode']):
-                        yield row
+        return chain.from_iterable(self.getPageAddresses())
+
+    def getPageAddresses(self):
+        """The addresses as a list for each page, in page order"""
+        if self.jobs and self.jobs > 1:
+            pages = self._getPageAddressesParallel()
+        else:
+            pages = self._getPageAddresses()
+        for rows in pages:
+            self.pagesDone += 1
+            yield [row for row in rows
+                   if self.postcode in (None, row['postcode'])]
+
+    def _getPageAddresses(self):
+        for page in self._getPages():
+            rows = self._getPreviousRows(page)
+            if rows is None:
+                rows = list(self._getPageRows(page))
             page.close()
+            yield rows
+
+    def _getPreviousRows(self, page):
+        if self.fingerprints is None:
+            return None
+        fingerprint = fingerprintPage(page)
+        self.fingerprints[page.page_number] = fingerprint
+        if self.previous is None:
+            return None
+        rows = self.previous.getRows(fingerprint, page.page_number)
+        if rows is not None:
+            self.pagesReused += 1
+        return rows
+
+    def _getPages(self):
+        if not self.streaming:
+            yield from self.pdf.pages
+            return
+        # pdfplumber keeps every Page it has made, and pdfminer every
+        # object it has parsed, so when streaming make each Page as it is
+        # needed and drop pdfminer's objects once it is done with
+        doc = self.pdf.doc
+        for pageNum, pageObj in enumerate(PDFPage.create_pages(doc), 1):
+            if self.pages is None or pageNum in self.pages:
+                yield Page(self.pdf, pageObj, page_number=pageNum)
+            doc._cached_objs.clear()
+
+    def _getPageRows(self, page):
+        if self.cache is None:
+            return self._plumbPage(page, self.postcode)
+        rows = self.cache.get(page.page_number)
+        if rows is None:
+            if self.postcode is not None:
+                # only whole pages are cached, so they serve whatever
+                # postcode comes next, but plumbing a whole page for one
+                # postcode would throw away the postcode prefilter
+                return self._plumbPage(page, self.postcode)
+            rows = list(self._plumbPage(page))
+            self.cache.put(page.page_number, rows)
+        return rows
 
-    def _getAssessmentRecords(self, page):
+    def _plumbPage(self, page, postcode=None):
         words = page.extract_words(extra_attrs=['size'])
+        if self._mayHavePostcode(words, postcode):
+            for record in self._getAssessmentRecords(page, words, postcode):
+                yield from record.getAddressRows()
+
+    def _getPageAddressesParallel(self):
+        # Each worker opens the PDF itself and plumbs a run of consecutive
+        # pages; map() hands back the runs in order so the rows come out
+        # just as they would serially.  Pages from the previous edition
+        # are slotted back in between.
+        allPageNums = []
+        pageNums = []
+        reused = {}
+        for page in self._getPages():
+            rows = self._getPreviousRows(page)
+            if rows is None:
+                pageNums.append(page.page_number)
+            else:
+                reused[page.page_number] = rows
+            allPageNums.append(page.page_number)
+            page.close()
+        chunkSize = -(-len(pageNums) // (self.jobs * self.chunksPerJob)) or 1
+        chunks = [pageNums[start:start + chunkSize]
+                  for start in range(0, len(pageNums), chunkSize)]
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            plumbed = chain.from_iterable(
+                          pool.map(_plumbPages, [self.path] * len(chunks),
+                                   [self.postcode] * len(chunks), chunks,
+                                   [self.cache] * len(chunks),
+                                   [self.streaming] * len(chunks)))
+            for pageNum in allPageNums:
+                rows = reused.pop(pageNum, None)
+                yield next(plumbed) if rows is None else rows
+
+    def _getAssessmentRecords(self, page, words, postcode=None):
         hLines = [word['top'] for word in words
                   if word['text'] == "Rates" and
                      word['size'] == Decimal("11.999")] + [810]
         top = hLines[0]
         for bottom in hLines[1:]:
-            yield AssessmentRecord(page, top, bottom)
+            recordWords = AssessmentRecord.getRecordWords(words, top, bottom)
+            if self._mayHavePostcode(recordWords, postcode):
+                yield AssessmentRecord(page, top, bottom, recordWords)
             top = bottom
 
+    @staticmethod
+    def _mayHavePostcode(words, postcode):
+        # skip pages and records without the postcode anywhere on them
+        # before doing any table work
+        return (postcode is None or
+                any(postcode in word['text'] for word in words))
 
-def saveAddresses(pdfPath, csvPath, **kwargs):
-    with RatingInformation(pdfPath, **kwargs) as prid, \
-         AddressWriter(csvPath) as csv:
-        csv.writeheader()
-        csv.writerows(prid.getAddresses())
 
-def parseArgs(rawArgs):
-    def parsePageSpec(pgSpec):
-        pages = []
-        for arg in pgSpec.split(","):
-            if "-" in arg:
-                start, end = map(int, arg.split("-"))
-                pages.extend(int(pg) for pg in range(start, end + 1))
-            else:
-                pages.append(int(arg))
-        return pages
+def _plumbPages(path, postcode, pages, cache=None, streaming=False):
+    with RatingInformation(path, postcode, pages, cache=cache,
+                           streaming=streaming) as prid:
+        return list(prid.getPageAddresses())
+
+def saveAddresses(pdfPath, outPath, format=None, deltaPath=None, **kwargs):
+    """Plumb the PDF to outPath, and unless that is stdout, the page
+    fingerprints to its manifest for the next edition to be plumbed
+    against.  Returns the RatingInformation for its counts."""
+    keepManifest = outPath != "-"
+    newRows = [] if deltaPath else None
+    with RatingInformation(pdfPath, fingerprint=keepManifest,
+                           **kwargs) as prid, \
+         openWriter(outPath, format) as out:
+        out.writeheader()
+        for rows in prid.getPageAddresses():
+            out.writerows(rows)
+            if newRows is not None:
+                newRows.extend(rows)
+            # each page is in the output as soon as it is plumbed
+            out.flush()
+    if keepManifest:
+        saveManifest(manifestPathFor(outPath), prid.fingerprints,
+                     kwargs.get('postcode'))
+    if deltaPath:
+        oldRows = prid.previous.rows if prid.previous else []
+        with DeltaWriter(deltaPath) as delta:
+            delta.writeheader()
+            delta.writerows(diffEditions(oldRows, newRows))
+    return prid
+
+def getPeakRss():
+    """Peak resident set size in MiB of this process and of its children"""
+    scale = 1 if sys.platform == "darwin" else 1024
+    return [resource.getrusage(who).ru_maxrss * scale / (1 << 20)
+            for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+
+def reportStreaming(prid, seconds):
+    selfRss, childRss = getPeakRss()
+    print("Plumbed {} pages in {:.2f}s, {:.1f} pages/sec, "
+          "peak RSS {:.1f} MiB (workers {:.1f} MiB)"
+          .format(prid.pagesDone, seconds, prid.pagesDone / (seconds or 1),
+                  selfRss, childRss), file=sys.stderr)
+
+def parsePageSpec(pgSpec):
+    pages = []
+    for arg in pgSpec.split(","):
+        if "-" in arg:
+            start, end = map(int, arg.split("-"))
+            pages.extend(int(pg) for pg in range(start, end + 1))
+        else:
+            pages.append(int(arg))
+    return pages
 
+def addPlumbArgs(parser):
+    parser.add_argument("--pages", type=parsePageSpec)
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="number of processes to plumb the pages with")
+    parser.add_argument("--cache", default="~/.cache/plumbprid",
+                        help="where to keep the rows plumbed from each page")
+    parser.add_argument("--no-cache", dest="cache", action='store_const',
+                        const=None, help="don't use the page cache")
+    parser.add_argument("--cache-size", type=int, default=200, metavar="MB",
+                        help="how big to let the page cache get")
+    parser.add_argument("--stream", action='store_true',
+                        help="plumb page by page in flat memory and report "
+                             "the peak RSS and pages per second")
+
+def plumbKwargs(args):
+    cache = None
+    if args.cache:
+        cache = PageCache(args.cache, hashFile(args.inpath),
+                          args.cache_size << 20)
+    return {'pages':     args.pages,
+            'jobs':      args.jobs,
+            'cache':     cache,
+            'streaming': args.stream}
+
+def parseArgs(rawArgs):
     parser = argparse.ArgumentParser(description=
         "Plumb the Public Rates Information Database")
-    parser.add_argument("--pages", type=parsePageSpec)
     parser.add_argument("--postcode")
+    addPlumbArgs(parser)
+    parser.add_argument("--format", choices=sorted(Writers),
+                        help="output format, otherwise chosen by extension")
+    parser.add_argument("--previous", metavar="PREVFile.csv",
+                        help="the output from the previous edition, whose "
+                             "unchanged pages need not be plumbed again")
+    parser.add_argument("--delta", metavar="DeltaFile.csv",
+                        help="where to write the rows added, removed or "
+                             "changed since the previous edition")
     parser.add_argument("inpath", metavar="PRIDFile.pdf")
     parser.add_argument("outpath", metavar="Outfile.csv",
                         nargs="?", default="-")
     args = parser.parse_args(rawArgs)
+    if args.outpath == "-" and args.format == 'sqlite':
+        parser.error("an SQLite output needs a file path")
+    if args.delta and not args.previous:
+        parser.error("--delta needs the --previous output to compare with")
     return args
 
 
 def main(rawArgs=sys.argv[1:]):
     args = parseArgs(rawArgs)
-    saveAddresses(args.inpath,
-                  args.outpath,
-                  postcode=args.postcode,
-                  pages=args.pages)
+    kwargs = plumbKwargs(args)
+    previous = None
+    if args.previous:
+        previous = PreviousEdition(args.previous, args.postcode)
+    started = time.perf_counter()
+    prid = saveAddresses(args.inpath,
+                         args.outpath,
+                         args.format,
+                         args.delta,
+                         postcode=args.postcode,
+                         previous=previous,
+                         **kwargs)
+    seconds = time.perf_counter() - started
+    if kwargs['cache']:
+        kwargs['cache'].evict()
+    if previous:
+        print("Reused {} of {} pages from {}"
+              .format(prid.pagesReused, prid.pagesDone, args.previous),
+              file=sys.stderr)
+    if args.stream:
+        reportStreaming(prid, seconds)
 
 
 if __name__ == "__main__":
@@ -1,69 +1,20 @@
 #!/bin/bash
 BLISSHOME=$(dirname $0)
-BLISSMAP="$BLISSHOME/makecdmap.py"
-BLISSLIST="$BLISSHOME/makecdlist.py"
-INKSCAPE="inkscape --shell"
-OUTPUT="/dev/null"
+BLISSAREAS="$BLISSHOME/makeareas.py"
 TAGS=""
 NOMAPS=""
 NOLISTS=""
 
-AREAS=(
-    'Derrick Road'
-    'Kelseyton'
-    'Oakleyville'
-    'Robbins Creek'
-    'Pickle Street',
-    'Sessions Road'
-    'Timber Lake'
-    'Uptonville'
-)
-
-function exportCmd() {
-    # Note: Inkscape version dependant
-    #echo "file-open:'$1'; export-type:pdf; export-do;"
-    SVGFILE="$1"
-    PDFFILE="${1%.svg}.pdf"
-    echo "'$SVGFILE'" --export-pdf "'$PDFFILE'"
-}
-
-function exportAreaCmd() {
-    if [[ -z $NOMAPS ]]; then
-        exportCmd "$1 Map.svg"
-    fi
-    if [[ -z $NOLISTS ]]; then
-        exportCmd "$1 Addresses.svg"
-    fi
-}
-
-function exportAreasCmd() {
-    for AREA in "${AREAS[@]}"; do
-        if [[ -z $TAGS || $TAGS =~ $AREA ]]; then
-            exportAreaCmd "$AREA"
-        fi
-    done
-    echo "quit"
-}
-
-function exportAreas() {
-    exportAreasCmd | $INKSCAPE >>$OUTPUT
-}
-
-function updateArea() {
-    if [[ -z $NOMAPS ]]; then
-        $BLISSMAP "$1.csv" "$1 Map.svg"
+function updateAreas() {
+    FLAGS=""
+    if [[ -n $NOMAPS ]]; then
+        FLAGS="$FLAGS -l"
     fi
-    if [[ -z $NOLISTS ]]; then
-        $BLISSLIST "$1.csv" "$1 Addresses.svg"
+    if [[ -n $NOLISTS ]]; then
+        FLAGS="$FLAGS -m"
     fi
-}
-
-function updateAreas() {
-    for AREA in "${AREAS[@]}"; do
-        if [[ -z $TAGS || $TAGS =~ $AREA ]]; then
-            updateArea "$AREA"
-        fi
-    done
+    # updates the areas then exports the changed SVGs to PDF
+    $BLISSAREAS --export $FLAGS $TAGS
 }
 
 function usage()
@@ -96,7 +47,6 @@ function parseArgs()
 
 parseArgs "$@"
 updateAreas
-exportAreas
 git commit -a -m "update"; git push
 
 